@@ -1,9 +1,15 @@
+import base64
+import hashlib
+import io
 import os
 import time
 import logging
 import argparse
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
 from typing import List, Optional, Tuple
 
@@ -19,11 +25,19 @@ try:
     import yfinance as yf
 except Exception:  # pragma: no cover - optional runtime dependency
     yf = None
+try:
+    import requests_cache
+except Exception:  # pragma: no cover - optional runtime dependency
+    requests_cache = None
 try:
     import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
     import pyarrow.parquet as pq
 except Exception:  # pragma: no cover - environment may lack pyarrow for lightweight tests
     pa = None
+    pc = None
+    ds = None
     pq = None
 try:
     from dotenv import load_dotenv
@@ -84,88 +98,119 @@ def _detect_ticker_level(cols: pd.MultiIndex, tickers: List[str]) -> int:
     return 0
 
 
-def _to_tidy(df: pd.DataFrame, tickers: List[str]) -> pd.DataFrame:
+def _ticker_slice_to_table(ticker: str, sub: pd.DataFrame, idx: pd.DatetimeIndex) -> "pa.Table":
+    """Build an Arrow table (ARROW_SCHEMA) from one ticker's field columns.
+
+    `sub` holds the per-ticker price columns (open/high/low/...); `idx` is the
+    already UTC-normalized, ms-precision DatetimeIndex shared by all tickers.
+    """
+    # Normalize field names and map to the canonical column set
+    cols = {}
+    for c in sub.columns:
+        key = str(c).strip().lower()
+        cols[COL_RENAME.get(key, key)] = sub[c]
+
+    n = len(sub)
+    arrays = [
+        pa.array(idx, type=pa.timestamp("ms")),
+        pa.array([ticker] * n, type=pa.string()),
+    ]
+    for name in ("open", "high", "low", "close", "adj_close"):
+        if name in cols:
+            arrays.append(pa.array(pd.to_numeric(cols[name], errors="coerce"), type=pa.float64()))
+        else:
+            arrays.append(pa.nulls(n, pa.float64()))
+
+    # volume: ensure int64 (non-null) for stable schema; coerce null -> 0
+    if "volume" in cols:
+        vol = pd.to_numeric(cols["volume"], errors="coerce").fillna(0)
+    else:
+        vol = pd.Series(0, index=sub.index)
+    arrays.append(pa.array(vol.astype("int64"), type=pa.int64()))
+
+    return pa.Table.from_arrays(arrays, schema=ARROW_SCHEMA)
+
+
+def _to_tidy(df: pd.DataFrame, tickers: List[str]) -> "pa.Table":
     """
-    Convert yfinance output to tidy:
+    Convert yfinance output to a tidy Arrow table (ARROW_SCHEMA):
     trade_date | ticker | open | high | low | close | adj_close | volume
+
+    Each ticker's column slice is converted to Arrow directly and the slices
+    concatenated — no `df.stack` row-pivot copy and no per-column astype
+    cascade over the stacked frame.
     """
+    if pa is None:
+        raise RuntimeError("pyarrow is required to build the tidy table — install pyarrow before running this code")
+
     if df.empty:
-        return df
+        return ARROW_SCHEMA.empty_table()
 
     # Index -> trade_date
-    df = df.copy()
-    # preserve timezone information if present on the index; prefer UTC for internal handling
-    idx = pd.to_datetime(df.index)
+    # NORMALIZATION RULE (Glue/Spark-friendly):
+    # - Convert any timezone-aware timestamps to UTC, then drop tz info.
+    # - If timestamps are timezone-naive, assume they represent UTC (this is the
+    #   storage standard). We log at DEBUG when we must assume UTC for traceability.
+    # yfinance already returns a DatetimeIndex, so only parse when it isn't one
+    idx = df.index if isinstance(df.index, pd.DatetimeIndex) else pd.to_datetime(df.index)
     if getattr(idx, "tz", None) is not None:
-        idx = idx.tz_convert("UTC")
-    df.index = idx
+        idx = idx.tz_convert("UTC").tz_localize(None)
+    else:
+        # tz-naive: assume UTC (don't loud-log at INFO to avoid noisy output)
+        logger.debug("trade_date index is timezone-naive — assuming UTC for storage")
+    # enforce millisecond precision (Arrow schema uses ms); skip the allocation
+    # when the index already carries ms values
+    if idx.dtype != "datetime64[ms]":
+        idx = idx.astype("datetime64[ms]")
 
     if isinstance(df.columns, pd.MultiIndex) and df.columns.nlevels == 2:
         ticker_level = _detect_ticker_level(df.columns, tickers)
         # Make level 0 = ticker, level 1 = field
         if ticker_level == 1:
-            df.columns = df.columns.swaplevel(0, 1)
-
-        # stack ticker into rows
-        tidy = df.stack(level=0, future_stack=True)
-        tidy.index.names = ["trade_date", "ticker"]
-        tidy = tidy.reset_index()
+            df = df.swaplevel(0, 1, axis=1)
+        slices = [(str(t), df[t]) for t in df.columns.get_level_values(0).unique()]
     else:
         # Single ticker case: yfinance sometimes returns simple columns
         # We require ticker column; infer from input if possible
         only = tickers[0] if tickers else "UNKNOWN"
-        tidy = df.reset_index().rename(columns={"index": "trade_date"})
-        tidy.insert(1, "ticker", only)
-
-    # Normalize columns
-    tidy.columns = [str(c).strip().lower() for c in tidy.columns]
-
-    # Rename pricing columns
-    renamed = {}
-    for c in tidy.columns:
-        key = c.strip().lower()
-        if key in COL_RENAME:
-            renamed[c] = COL_RENAME[key]
-    tidy = tidy.rename(columns=renamed)
-
-    # Keep only expected set (if missing, create as null)
-    expected = ["trade_date", "ticker", "open", "high", "low", "close", "adj_close", "volume"]
-    for c in expected:
-        if c not in tidy.columns:
-            tidy[c] = pd.NA
-    tidy = tidy[expected]
-
-    # Types: trade_date as timezone-naive Timestamp (keep time for intraday),
-    # ticker as string; numerics as float/int
-    tidy["trade_date"] = pd.to_datetime(tidy["trade_date"], errors="coerce")
+        slices = [(str(only), df)]
 
-    # NORMALIZATION RULE (Glue/Spark-friendly):
-    # - Convert any timezone-aware timestamps to UTC, then drop tz info.
-    # - If timestamps are timezone-naive, assume they represent UTC (this is the
-    #   storage standard). We log at DEBUG when we must assume UTC for traceability.
-    try:
-        # tz-aware -> convert to UTC
-        if getattr(tidy["trade_date"].dt, "tz", None) is not None:
-            tidy["trade_date"] = tidy["trade_date"].dt.tz_convert("UTC").dt.tz_localize(None)
-        else:
-            # tz-naive: assume UTC (don't loud-log at INFO to avoid noisy output)
-            logger.debug("trade_date series is timezone-naive — assuming UTC for storage")
-    except Exception:
-        # Fallback: coerce and assume UTC
-        tidy["trade_date"] = pd.to_datetime(tidy["trade_date"], errors="coerce").dt.tz_localize(None)
+    tables = [_ticker_slice_to_table(t, sub, idx) for t, sub in slices]
+    return pa.concat_tables(tables)
 
-    # enforce millisecond precision (Arrow schema uses ms)
-    tidy["trade_date"] = tidy["trade_date"].astype("datetime64[ms]")
-    tidy["ticker"] = tidy["ticker"].astype(str) 
 
-    for c in ["open", "high", "low", "close", "adj_close"]:
-        tidy[c] = pd.to_numeric(tidy[c], errors="coerce").astype("float64")
+# Yahoo's endpoints accept up to ~20 symbols per request; batching keeps the
+# HTTP round-trip count at ceil(N/20) instead of one per ticker.
+TICKER_BATCH_SIZE = 20
 
-    # volume: ensure int64 (non-null) for stable schema; coerce null -> 0
-    vol = pd.to_numeric(tidy["volume"], errors="coerce")
-    tidy["volume"] = vol.fillna(0).astype("int64")
+# Validator tables/regexes are module-level so repeated validation (e.g. over a
+# scripted backfill list) doesn't rebuild sets or hit the re compile cache.
+INTRADAY_INTERVALS = frozenset({"1m", "2m", "5m", "15m", "30m", "60m", "90m"})
+DAILY_INTERVALS = frozenset({"1d", "1wk", "1mo"})
+KNOWN_INTERVALS = INTRADAY_INTERVALS | DAILY_INTERVALS
+
+_PERIOD_RE = re.compile(r"^\d+(m|d|mo|y|wk|w)$")
+_INTRADAY_LONG_PERIOD_RE = re.compile(r"^(\d+)(mo|y)$")
+
+
+def _download_batched(tickers: List[str], download_kwargs: dict) -> pd.DataFrame:
+    """Download quotes in batches of TICKER_BATCH_SIZE tickers and join the frames.
+
+    Batches are fetched concurrently (they are pure network waits) and the
+    resulting ticker-grouped frames concatenated along the column axis, which
+    reproduces the shape of a single yf.download call over all tickers.
+    """
+    batches = [tickers[i : i + TICKER_BATCH_SIZE] for i in range(0, len(tickers), TICKER_BATCH_SIZE)]
+    if len(batches) <= 1:
+        return yf.download(tickers, **download_kwargs)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        frames = list(pool.map(lambda batch: yf.download(batch, **download_kwargs), batches))
 
-    return tidy
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, axis=1)
 
 
 def _validate_interval_period(interval: str, period: str) -> None:
@@ -175,19 +220,15 @@ def _validate_interval_period(interval: str, period: str) -> None:
     - When used from argparse validators, raise argparse.ArgumentTypeError for prettier CLI errors.
     - Emits warnings for intraday intervals combined with long periods.
     """
-    intraday = {"1m", "2m", "5m", "15m", "30m", "60m", "90m"}
-    daily = {"1d", "1wk", "1mo"}
-
-    all_known = intraday | daily
-    if interval not in all_known:
+    if interval not in KNOWN_INTERVALS:
         raise ValueError(
-            f"unsupported interval '{interval}'. supported examples: {sorted(list(all_known))}"
+            f"unsupported interval '{interval}'. supported examples: {sorted(list(KNOWN_INTERVALS))}"
         )
 
     # Friendly warning: intraday intervals usually have limited historical window on Yahoo
-    if interval in intraday:
+    if interval in INTRADAY_INTERVALS:
         # treat long periods (years / many months) as potentially incompatible
-        m = re.match(r"^(\d+)(mo|y)$", period)
+        m = _INTRADAY_LONG_PERIOD_RE.match(period)
         if period.endswith("y") or (m and m.group(1) and m.group(2) == "mo" and int(m.group(1)) > 6):
             logger.warning(
                 "Intraday interval '%s' + long period '%s' may return truncated history from Yahoo.",
@@ -210,7 +251,7 @@ def validate_period_arg(value: str) -> str:
     allowed_special = {"max", "ytd"}
     if value in allowed_special:
         return value
-    if not re.match(r"^\d+(m|d|mo|y|wk|w)$", value):
+    if not _PERIOD_RE.match(value):
         raise argparse.ArgumentTypeError(
             "invalid period format; examples: 1d,7d,1mo,3mo,1y,max,ytd"
         )
@@ -227,66 +268,90 @@ def validate_date_arg(value: str) -> str:
     return d.strftime("%Y-%m-%d")
 
 
-def _write_parquet_atomic(df_day: pd.DataFrame, out_path: Path) -> None:
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = out_path.with_suffix(".parquet.tmp")
+# Shared Parquet write options.
+# ZSTD level 3 gives markedly smaller files than Snappy at comparable read
+# speed; modern Spark/Glue read ZSTD Parquet natively, so no flavor pin needed.
+# Dictionary-encode ticker (~10 unique values per file) and keep row-group
+# min/max statistics so readers can prune on trade_date; Parquet v2.6 enables
+# the RLE_DICTIONARY encoding.
+PARQUET_WRITE_OPTIONS = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "version": "2.6",
+    "use_dictionary": ["ticker"],
+    "write_statistics": True,
+    "data_page_size": 1024 * 1024,
+    "dictionary_pagesize_limit": 1024 * 1024,
+}
+
 
-    # Build Arrow table with fixed schema (avoids Spark/Glue infer weirdness)
+def _write_parquet_atomic(table: "pa.Table", out_path: Optional[Path] = None, sink=None) -> None:
+    """Write `table` as Parquet, either atomically to `out_path` or into `sink`.
+
+    `sink` may be any pyarrow-writable object (e.g. io.BytesIO) for callers
+    that upload the bytes directly instead of touching disk.
+    """
+    # The tidy pipeline hands us an Arrow table already in the fixed schema
+    # (avoids Spark/Glue infer weirdness), so no per-column rebuild here.
     if pa is None or pq is None:
         raise RuntimeError("pyarrow is required to write Parquet files — install pyarrow before running this code")
 
-    arrays = [
-        # ensure timestamp in ms and timezone-naive
-        pa.array(df_day["trade_date"].astype("datetime64[ms]"), type=pa.timestamp("ms")),
-        pa.array(df_day["ticker"].astype(str), type=pa.string()),
-        pa.array(df_day["open"].astype("float64"), type=pa.float64()),
-        pa.array(df_day["high"].astype("float64"), type=pa.float64()),
-        pa.array(df_day["low"].astype("float64"), type=pa.float64()),
-        pa.array(df_day["close"].astype("float64"), type=pa.float64()),
-        pa.array(df_day["adj_close"].astype("float64"), type=pa.float64()),
-        pa.array(df_day["volume"].astype("int64"), type=pa.int64()),
-    ]
-    table = pa.Table.from_arrays(arrays, schema=ARROW_SCHEMA)
+    if sink is not None:
+        pq.write_table(table, sink, **PARQUET_WRITE_OPTIONS)
+        return
 
-    pq.write_table(
-        table,
-        tmp.as_posix(),
-        compression="snappy",
-        version="1.0",
-        flavor="spark",
-        use_dictionary=False,
-        write_statistics=False,
-    )
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(".parquet.tmp")
 
-    # Quick sanity (magic bytes)
-    with open(tmp, "rb") as f:
-        if f.read(4) != b"PAR1":
-            raise RuntimeError("parquet-magic-missing")
-    # ensure footer exists (also PAR1)
-    with open(tmp, "rb") as f:
-        f.seek(-4, 2)
-        if f.read(4) != b"PAR1":
-            raise RuntimeError("parquet-footer-magic-missing")
+    pq.write_table(table, tmp.as_posix(), **PARQUET_WRITE_OPTIONS)
+
+    # Quick sanity: parsing the footer metadata verifies both PAR1 markers and
+    # the footer structure in one pass (cheaper than two open/seek/read pairs)
+    try:
+        pq.read_metadata(tmp.as_posix())
+    except Exception as e:
+        raise RuntimeError("parquet-invalid") from e
 
     tmp.replace(out_path)
 
 
+MULTIPART_THRESHOLD = 64 * 1024 * 1024  # avoid multipart for small files
+
+
 def _upload_s3_checked(s3, bucket: str, key: str, local_path: Path, retries: int = 3) -> None:
+    # preferred_transfer_client="auto" routes transfers through the AWS CRT
+    # (C) transfer manager when boto3[crt] is installed — it parallelizes parts
+    # inside a single file and releases the GIL during upload. Without awscrt
+    # boto3 silently falls back to the classic pure-Python manager.
+    # 8 MiB parts give multipart files enough parallelism to saturate the NIC.
     cfg = TransferConfig(
-        multipart_threshold=64 * 1024 * 1024,  # avoid multipart for small files
-        multipart_chunksize=16 * 1024 * 1024,
-        max_concurrency=2,
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=8 * 1024 * 1024,
+        max_concurrency=10,
         use_threads=True,
+        preferred_transfer_client="auto",
     )
 
     size = local_path.stat().st_size
+
     for attempt in range(1, retries + 1):
         try:
-            s3.upload_file(local_path.as_posix(), bucket, key, Config=cfg)
-
-            head = s3.head_object(Bucket=bucket, Key=key)
-            if head.get("ContentLength", -1) != size:
-                raise RuntimeError("s3-size-mismatch")
+            if size < MULTIPART_THRESHOLD:
+                # single-PUT path: S3 verifies the Content-MD5 server-side and
+                # rejects a corrupted body, so no follow-up HEAD round-trip is
+                # needed. s3transfer rejects ContentMD5 as an upload_file
+                # ExtraArg, so PUT the body directly (same as the --s3-only
+                # in-memory path).
+                body = local_path.read_bytes()
+                digest = base64.b64encode(hashlib.md5(body).digest()).decode()
+                s3.put_object(Bucket=bucket, Key=key, Body=body, ContentMD5=digest)
+            else:
+                s3.upload_file(local_path.as_posix(), bucket, key, Config=cfg)
+                # multipart path: chunk ETags are verified by the transfer
+                # manager; keep the size HEAD as belt-and-braces for big files
+                head = s3.head_object(Bucket=bucket, Key=key)
+                if head.get("ContentLength", -1) != size:
+                    raise RuntimeError("s3-size-mismatch")
 
             logger.info("🚀 S3 OK: s3://%s/%s (%d bytes)", bucket, key, size)
             return
@@ -297,6 +362,9 @@ def _upload_s3_checked(s3, bucket: str, key: str, local_path: Path, retries: int
             if code in {"403", "AccessDenied"}:
                 raise RuntimeError("s3-access-denied: check credentials and bucket policy") from e
             time.sleep(attempt)
+        except ValueError:
+            # bad-argument errors are deterministic — retrying cannot help
+            raise
         except Exception as e:
             logger.warning("S3 upload failed (attempt=%d): %s", attempt, e)
             time.sleep(attempt)
@@ -341,6 +409,16 @@ def ingest(
             "auto_adjust": False,
             "threads": True,
         }
+        # cache Yahoo responses on disk when requests_cache is installed:
+        # re-running the same backfill/date range then costs no network I/O
+        if requests_cache is not None:
+            download_kwargs["session"] = requests_cache.CachedSession(
+                ".yf_cache",
+                expire_after=timedelta(hours=6),
+                allowable_methods=("GET", "POST"),
+            )
+        else:
+            logger.debug("requests_cache not installed — yfinance responses will not be cached")
         # start/end override period when provided (dates are inclusive on input; end should be exclusive for yfinance)
         if start_date or end_date:
             if start_date:
@@ -350,7 +428,7 @@ def ingest(
         else:
             download_kwargs["period"] = period
 
-        df = yf.download(tickers, **download_kwargs)
+        df = _download_batched(tickers, download_kwargs)
     except Exception as e:
         # yfinance may raise a variety of errors (network/HTTP/parsing). Surface a helpful message.
         raise RuntimeError(
@@ -362,40 +440,85 @@ def ingest(
         return
 
     tidy = _to_tidy(df, tickers)
-    if tidy.empty:
-        logger.warning("Tidy dataframe empty.")
+    if tidy.num_rows == 0:
+        logger.warning("Tidy table empty.")
         return
 
     logger.info("Timestamps normalized to UTC for storage (logical TIMESTAMP, no tz).")
 
-    # Write one file per day
-    s3 = boto3.client("s3") if upload_to_s3 else None
-
     if upload_to_s3 and not s3_bucket:
         raise RuntimeError("S3_BUCKET not set.")
 
-    processed = 0
-    # partition by calendar day (YYYY-MM-DD) while keeping full timestamp values
-    tidy["trade_day"] = tidy["trade_date"].dt.strftime("%Y-%m-%d")
-    for dt, grp in tidy.groupby("trade_day", sort=True):
-        if grp.empty:
-            continue
-
-        key = f"{s3_prefix.rstrip('/')}/dt={dt}/b3_stocks.parquet"
-        local_path = out_dir / key
+    # S3 uploads run concurrently; boto3 clients are not thread-safe for all
+    # operations, so each worker gets its own client via thread-local storage.
+    tls = threading.local()
+
+    def _s3_client():
+        if getattr(tls, "s3", None) is None:
+            tls.s3 = boto3.session.Session().client("s3")
+        return tls.s3
+
+    # partition by calendar day (dt=YYYY-MM-DD) while keeping full timestamp values;
+    # write_dataset partitions and writes all days in one C++ pass over the table
+    trade_days = pc.strftime(tidy["trade_date"], format="%Y-%m-%d")
+    table = tidy.append_column("dt", trade_days)
+
+    if upload_to_s3 and not write_local:
+        # --s3-only: encode each day file in memory and PUT it straight to S3 —
+        # no disk write, stat, read-back, or unlink per file
+        days = sorted(pc.unique(trade_days).to_pylist())
+
+        def _put_day(dt: str) -> None:
+            grp = tidy.filter(pc.equal(trade_days, dt))
+            buf = io.BytesIO()
+            _write_parquet_atomic(grp, sink=buf)
+            key = f"{s3_prefix.rstrip('/')}/dt={dt}/b3_stocks-0.parquet"
+            body = buf.getvalue()
+            _s3_client().put_object(Bucket=s3_bucket, Key=key, Body=body)
+            logger.info("🚀 S3 OK: s3://%s/%s (%d bytes, in-memory)", s3_bucket, key, len(body))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(_put_day, d) for d in days]
+            for fut in futures:
+                fut.result()
+
+        logger.info("Done. Days processed: %d", len(days))
+        return
 
-        # drop the helper column when writing
-        to_write = grp.drop(columns=["trade_day"]) if "trade_day" in grp.columns else grp
+    base_dir = out_dir / s3_prefix.rstrip("/")
+    written: List[Path] = []
+    ds.write_dataset(
+        table,
+        base_dir=base_dir.as_posix(),
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("dt", pa.string())]), flavor="hive"),
+        file_options=ds.ParquetFileFormat().make_write_options(**PARQUET_WRITE_OPTIONS),
+        basename_template="b3_stocks-{i}.parquet",
+        # delete_matching replaces a rewritten day partition wholesale, so a
+        # re-ingest never leaves stale files (e.g. a pre-rename
+        # b3_stocks.parquet) sitting beside the fresh ones
+        existing_data_behavior="delete_matching",
+        file_visitor=lambda f: written.append(Path(f.path)),
+    )
 
-        # always write the file locally first (needed for upload), optionally keep it
-        _write_parquet_atomic(to_write, local_path)
+    uploads: List[Tuple[Path, str]] = []
+    processed = 0
+    for local_path in sorted(written):
+        key = local_path.relative_to(out_dir).as_posix()
         if write_local:
-            logger.info("✅ Local OK: %s (%d rows)", local_path, len(to_write))
+            logger.info("✅ Local OK: %s", local_path)
         else:
-            logger.info("✅ Temp file written for upload: %s (%d rows)", local_path, len(to_write))
+            logger.info("✅ Temp file written for upload: %s", local_path)
 
         if upload_to_s3:
-            _upload_s3_checked(s3, s3_bucket, key, local_path)
+            uploads.append((local_path, key))
+
+        processed += 1
+
+    if uploads:
+
+        def _upload_one(local_path: Path, key: str) -> None:
+            _upload_s3_checked(_s3_client(), s3_bucket, key, local_path)
             if not write_local:
                 try:
                     local_path.unlink()
@@ -403,7 +526,12 @@ def ingest(
                 except Exception:
                     logger.warning("Failed to remove temp local file: %s", local_path)
 
-        processed += 1
+        # per-object PUTs are latency-bound, so they parallelize near-linearly
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(_upload_one, p, k) for p, k in uploads]
+            # .result() re-raises the first upload failure, preserving error semantics
+            for fut in futures:
+                fut.result()
 
     logger.info("Done. Days processed: %d", processed)
 
@@ -0,0 +1,54 @@
+"""Shared .env loading for the S3 CLI scripts.
+
+Both s3_downloader.py and s3_uploader.py used to carry the same
+line-by-line .env parser and re-read the file on every import. The logic
+lives here once, runs at most once per process, and skips disk entirely
+when the credentials are already in the environment — relevant when an
+orchestrator spawns the CLIs per date.
+"""
+import functools
+import os
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+except Exception:  # pragma: no cover - optional dev dependency
+    load_dotenv = None
+
+
+def _load_env_fallback(path: str = ".env") -> None:
+    """Lightweight .env loader used when python-dotenv is not installed."""
+    p = Path(path)
+    if not p.exists():
+        return
+    try:
+        for line in p.read_text().splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "=" not in line:
+                continue
+            k, v = line.split("=", 1)
+            k = k.strip()
+            v = v.strip().strip("\"'")
+            # only load AWS and S3 related keys (safer)
+            if k.startswith("AWS_") or k.startswith("S3_"):
+                os.environ.setdefault(k, v)
+    except Exception:
+        # non-fatal; continue without raising
+        return
+
+
+@functools.lru_cache(maxsize=None)
+def load(path: str = ".env") -> None:
+    """Load AWS/S3 variables from `path` once per process.
+
+    Short-circuits without touching disk only when everything the CLIs
+    resolve from .env — credentials and the bucket — is already set.
+    """
+    if all(os.environ.get(k) for k in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "S3_BUCKET")):
+        return
+    if load_dotenv is not None:
+        load_dotenv(path)
+        return
+    _load_env_fallback(path)
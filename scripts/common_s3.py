@@ -0,0 +1,33 @@
+"""Shared boto3 client construction for the S3 CLI scripts.
+
+boto3 clients are thread-safe, so the downloader and uploader hand one
+client to their whole worker pool — but the default botocore config caps
+the connection pool at 10 and uses standard retries, which queues
+requests and hammers throttled endpoints at high concurrency.
+"""
+try:
+    import boto3
+except Exception:  # pragma: no cover - optional runtime dependency
+    boto3 = None
+
+try:
+    from botocore.config import Config
+except Exception:  # pragma: no cover - optional runtime dependency
+    Config = None
+
+
+def make_s3(concurrency: int = 16):
+    """S3 client sized for a thread pool of `concurrency` workers.
+
+    The connection pool is kept ahead of the worker count so requests never
+    queue on a free worker, and adaptive retries back off automatically when
+    S3 starts returning 503s.
+    """
+    if boto3 is None:
+        raise RuntimeError("boto3 is required for S3 transfers — install boto3")
+    cfg = Config(
+        max_pool_connections=max(32, concurrency * 2),
+        retries={"mode": "adaptive", "max_attempts": 5},
+        tcp_keepalive=True,
+    ) if Config is not None else None
+    return boto3.client("s3", config=cfg)
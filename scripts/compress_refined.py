@@ -1,77 +1,169 @@
-import argparse
-import logging
-from pathlib import Path
-import sys
-import pandas as pd
-
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
-logger = logging.getLogger("compress_refined")
-
-DEFAULT_COMPRESSION = "snappy"
-
-
-def process_file(p: Path, compression: str = DEFAULT_COMPRESSION, dry_run: bool = False) -> bool:
-    """Rewrite a parquet file with given compression. Returns True if file was (or would be) rewritten."""
-    try:
-        df = pd.read_parquet(p)
-    except Exception as e:
-        logger.warning("Failed to read %s: %s", p, e)
-        return False
-
-    if dry_run:
-        logger.info("[dry-run] Would rewrite %s with compression=%s", p, compression)
-        return True
-
-    tmp = p.with_suffix(p.suffix + ".tmp")
-    try:
-        df.to_parquet(tmp.as_posix(), index=False, compression=compression)
-        tmp.replace(p)
-        logger.info("Rewrote %s with compression=%s", p, compression)
-        return True
-    except Exception as e:
-        logger.error("Failed to write compressed parquet for %s: %s", p, e)
-        try:
-            if tmp.exists():
-                tmp.unlink()
-        except Exception:
-            pass
-        return False
-
-
-def find_parquets(base: Path):
-    return list(base.rglob("*.parquet"))
-
-
-def main(argv=None) -> int:
-    parser = argparse.ArgumentParser(description="Rewrite parquet files under a path with specified compression")
-    parser.add_argument("--path", default="data/refined", help="Base path containing refined parquets")
-    parser.add_argument("--dry-run", action="store_true", help="Only show files that would be rewritten")
-    parser.add_argument("--confirm", action="store_true", help="Apply changes (not just dry-run)")
-    parser.add_argument("--compression", default=DEFAULT_COMPRESSION, help="Compression codec to use (default: snappy)")
-
-    args = parser.parse_args(argv)
-
-    base = Path(args.path)
-    if not base.exists():
-        logger.error("Base path not found: %s", base)
-        return 2
-
-    files = find_parquets(base)
-    logger.info("Parquet files found: %d", len(files))
-
-    rewritten = 0
-    for f in files:
-        rewritten_this = process_file(f, compression=args.compression, dry_run=args.dry_run or not args.confirm)
-        if rewritten_this and (args.confirm or args.dry_run):
-            rewritten += 1
-
-    if args.dry_run:
-        logger.info("Dry-run complete. Files that would be rewritten: %d", rewritten)
-    else:
-        logger.info("Done. Files rewritten: %d", rewritten)
-
-    return 0
-
-
-if __name__ == "__main__":
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import sys
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except Exception:  # pragma: no cover - fall back to the pandas engine round-trip
+    pq = None
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger("compress_refined")
+
+DEFAULT_COMPRESSION = "zstd"
+DEFAULT_COMPRESSION_LEVEL = 3
+
+
+def _process_file_pandas(p: Path, compression: str, write_kwargs: dict) -> bool:
+    """Fallback rewrite via the pandas engine round-trip (no pyarrow installed)."""
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    try:
+        df = pd.read_parquet(p)
+        df.to_parquet(tmp.as_posix(), index=False, compression=compression, **write_kwargs)
+        tmp.replace(p)
+        logger.info("Rewrote %s with compression=%s", p, compression)
+        return True
+    except Exception as e:
+        logger.error("Failed to write compressed parquet for %s: %s", p, e)
+        try:
+            if tmp.exists():
+                tmp.unlink()
+        except Exception:
+            pass
+        return False
+
+
+def process_file(
+    p: Path,
+    compression: str = DEFAULT_COMPRESSION,
+    compression_level: int = None,
+    dry_run: bool = False,
+) -> bool:
+    """Rewrite a parquet file with given compression. Returns True if file was (or would be) rewritten.
+
+    With pyarrow available the rewrite streams row group by row group through a
+    ParquetWriter, so peak memory stays bounded by one row group instead of the
+    whole file; dry-run only parses the footer.
+    """
+    # only pass compression_level when set: codecs like snappy reject levels
+    write_kwargs = {}
+    if compression_level is not None:
+        write_kwargs["compression_level"] = compression_level
+
+    if pq is None:
+        if dry_run:
+            try:
+                pd.read_parquet(p)
+            except Exception as e:
+                logger.warning("Failed to read %s: %s", p, e)
+                return False
+            logger.info("[dry-run] Would rewrite %s with compression=%s", p, compression)
+            return True
+        return _process_file_pandas(p, compression, write_kwargs)
+
+    try:
+        reader = pq.ParquetFile(p.as_posix())
+    except Exception as e:
+        logger.warning("Failed to read %s: %s", p, e)
+        return False
+
+    if dry_run:
+        logger.info("[dry-run] Would rewrite %s with compression=%s", p, compression)
+        return True
+
+    tmp = p.with_suffix(p.suffix + ".tmp")
+    try:
+        with pq.ParquetWriter(tmp.as_posix(), reader.schema_arrow, compression=compression, **write_kwargs) as writer:
+            for i in range(reader.num_row_groups):
+                writer.write_table(reader.read_row_group(i))
+        tmp.replace(p)
+        logger.info("Rewrote %s with compression=%s", p, compression)
+        return True
+    except Exception as e:
+        logger.error("Failed to write compressed parquet for %s: %s", p, e)
+        try:
+            if tmp.exists():
+                tmp.unlink()
+        except Exception:
+            pass
+        return False
+
+
+def find_parquets(base: Path):
+    """Yield parquet files as the directory walk discovers them.
+
+    Walks with os.scandir: DirEntry answers is_dir/is_file from the readdir
+    data, avoiding the per-entry stat that Path.rglob pays.
+    """
+    stack = [base]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".parquet"):
+                        yield Path(entry.path)
+        except OSError as e:
+            logger.warning("Skipping unreadable directory: %s", e)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rewrite parquet files under a path with specified compression")
+    parser.add_argument("--path", default="data/refined", help="Base path containing refined parquets")
+    parser.add_argument("--dry-run", action="store_true", help="Only show files that would be rewritten")
+    parser.add_argument("--confirm", action="store_true", help="Apply changes (not just dry-run)")
+    parser.add_argument("--compression", default=DEFAULT_COMPRESSION, help="Compression codec to use (default: zstd)")
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        default=None,
+        help="Codec compression level (default: %d for zstd; ignored by codecs without levels)" % DEFAULT_COMPRESSION_LEVEL,
+    )
+
+    args = parser.parse_args(argv)
+
+    base = Path(args.path)
+    if not base.exists():
+        logger.error("Base path not found: %s", base)
+        return 2
+
+    level = args.compression_level
+    if level is None and args.compression == "zstd":
+        level = DEFAULT_COMPRESSION_LEVEL
+
+    dry_run = args.dry_run or not args.confirm
+
+    # each file is an independent decompress/recompress job (CPU-bound), so
+    # fan out across cores with a process pool instead of looping serially;
+    # submitting as the walk streams in overlaps the stat() walk with work
+    rewritten = 0
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        futures = {
+            pool.submit(process_file, f, compression=args.compression, compression_level=level, dry_run=dry_run): f
+            for f in find_parquets(base)
+        }
+        logger.info("Parquet files found: %d", len(futures))
+        for fut in as_completed(futures):
+            try:
+                rewritten_this = fut.result()
+            except Exception as e:
+                logger.error("Worker failed for %s: %s", futures[fut], e)
+                continue
+            if rewritten_this and (args.confirm or args.dry_run):
+                rewritten += 1
+
+    if args.dry_run:
+        logger.info("Dry-run complete. Files that would be rewritten: %d", rewritten)
+    else:
+        logger.info("Done. Files rewritten: %d", rewritten)
+
+    return 0
+
+
+if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -1,172 +1,235 @@
-import os
-import sys
-import time
-import logging
-import argparse
-from pathlib import Path
-from typing import Iterator, Optional
-
-try:
-    import boto3
-    from boto3.s3.transfer import TransferConfig
-except Exception:  # pragma: no cover - optional runtime dependency
-    boto3 = None
-    TransferConfig = None
-
-try:
-    from dotenv import load_dotenv
-except Exception:  # pragma: no cover - optional dev dependency
-    load_dotenv = None
-
-
-# Lightweight .env loader (same approach as s3_downloader)
-def _load_env_fallback(path: str = ".env") -> None:
-    p = Path(path)
-    if not p.exists():
-        return
-    try:
-        for line in p.read_text().splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" not in line:
-                continue
-            k, v = line.split("=", 1)
-            k = k.strip()
-            v = v.strip().strip("\"'")
-            if k.startswith("AWS_") or k.startswith("S3_"):
-                os.environ.setdefault(k, v)
-    except Exception:
-        return
-
-
-if load_dotenv is not None:
-    load_dotenv()
-else:
-    _load_env_fallback()
-
-
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
-logger = logging.getLogger("s3_uploader")
-
-
-def _list_local_files_recursive(root: Path) -> Iterator[Path]:
-    """Yield all file paths under `root` (skips directories)."""
-    for p in root.rglob("*"):
-        if p.is_file():
-            yield p
-
-
-def _upload_s3_checked(s3, bucket: str, key: str, local_path: Path, retries: int = 3) -> None:
-    """Upload local file to s3://bucket/key with size verification and retries."""
-    cfg = TransferConfig(
-        multipart_threshold=64 * 1024 * 1024,  # avoid multipart for small files
-        multipart_chunksize=16 * 1024 * 1024,
-        max_concurrency=2,
-        use_threads=True,
-    ) if TransferConfig is not None else None
-
-    size = local_path.stat().st_size
-    for attempt in range(1, retries + 1):
-        try:
-            if cfg is not None:
-                s3.upload_file(local_path.as_posix(), bucket, key, Config=cfg)
-            else:
-                s3.upload_file(local_path.as_posix(), bucket, key)
-
-            head = s3.head_object(Bucket=bucket, Key=key)
-            if head.get("ContentLength", -1) != size:
-                raise RuntimeError("s3-size-mismatch")
-
-            logger.info("✅ Uploaded: s3://%s/%s (%d bytes)", bucket, key, size)
-            return
-        except Exception as e:
-            # try to extract helpful info if botocore present
-            try:
-                import botocore
-                from botocore.exceptions import ClientError
-            except Exception:
-                ClientError = None
-
-            if ClientError is not None and isinstance(e, ClientError):
-                logger.warning("S3 ClientError (attempt=%d): %s", attempt, e)
-                code = e.response.get("Error", {}).get("Code", "")
-                if code in {"403", "AccessDenied"}:
-                    raise RuntimeError("s3-access-denied: check credentials and bucket policy") from e
-            else:
-                logger.warning("S3 upload failed (attempt=%d): %s", attempt, e)
-
-            time.sleep(attempt)
-
-    raise RuntimeError(f"upload_failed: s3://{bucket}/{key}")
-
-
-def upload_prefix(bucket: str, prefix: str, local_root: Path, s3=None, dry_run: bool = False) -> int:
-    """Upload all files under `local_root` to s3://bucket/prefix/... preserving relative paths.
-
-    Returns number of objects uploaded (or would be uploaded in dry-run).
-    """
-    if s3 is None:
-        if boto3 is None:
-            raise RuntimeError("boto3 is required to upload to S3 — install boto3")
-
-        # warn if credentials not detected
-        session = boto3.Session()
-        creds = session.get_credentials()
-        if creds is None and not any(os.environ.get(k) for k in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_PROFILE")):
-            logger.warning(
-                "AWS credentials not detected in environment. If you use a .env file, ensure it contains AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY or use a configured profile."
-            )
-
-        s3 = boto3.client("s3")
-
-    prefix = prefix.strip("/")
-    count = 0
-
-    root = local_root
-    if not root.exists():
-        raise RuntimeError(f"local_root does not exist: {root}")
-
-    for local_path in _list_local_files_recursive(root):
-        rel = local_path.relative_to(root)
-        key = f"{prefix}/{rel.as_posix()}" if prefix else rel.as_posix()
-
-        if dry_run:
-            logger.info("[dry-run] %s -> s3://%s/%s", local_path, bucket, key)
-            count += 1
-            continue
-
-        _upload_s3_checked(s3, bucket, key, local_path)
-        count += 1
-
-    logger.info("Done. Objects processed: %d", count)
-    return count
-
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "--local-root",
-        default="data/refined",
-        help="Local root dir to upload (default: data/refined)",
-    )
-    parser.add_argument("--prefix", default="refined", help="S3 prefix to upload into (default: refined)")
-    parser.add_argument("--bucket", help="S3 bucket name (defaults to S3_BUCKET env var)")
-    parser.add_argument("--dry-run", action="store_true", help="List objects that would be uploaded and exit")
-
-    args = parser.parse_args()
-
-    bucket = args.bucket or os.environ.get("S3_BUCKET")
-
-    if not bucket:
-        logger.error("S3 bucket not specified. Set --bucket or S3_BUCKET env var.")
-        sys.exit(2)
-
-    try:
-        upload_prefix(bucket=bucket, prefix=args.prefix, local_root=Path(args.local_root), dry_run=args.dry_run)
-    except RuntimeError as e:
-        logger.error("Runtime error: %s", e)
-        sys.exit(4)
-    except Exception as e:
-        logger.exception("Unexpected error: %s", e)
-        sys.exit(99)
+import hashlib
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+except Exception:  # pragma: no cover - optional runtime dependency
+    boto3 = None
+    TransferConfig = None
+
+from common_env import load as _load_env
+from common_s3 import make_s3
+
+_load_env()
+
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger("s3_uploader")
+
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+
+
+def _list_local_files_recursive(root: Path) -> Iterator[Path]:
+    """Yield all file paths under `root` (skips directories)."""
+    for p in root.rglob("*"):
+        if p.is_file():
+            yield p
+
+
+def _list_remote_objects(s3, bucket: str, prefix: str) -> dict:
+    """Map key -> (size, etag) for all objects under prefix in one LIST pass."""
+    out = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            out[obj["Key"]] = (obj.get("Size"), obj.get("ETag", "").strip('"'))
+    return out
+
+
+def _already_uploaded(local_path: Path, size: int, remote: tuple) -> bool:
+    """True when the remote object already matches the local file.
+
+    Single-PUT objects carry a plain MD5 ETag, so small files are compared by
+    content hash; multipart ETags are not an MD5, so size match is the best
+    cheap signal there.
+    """
+    remote_size, remote_etag = remote
+    if remote_size != size:
+        return False
+    if size < MULTIPART_THRESHOLD and "-" not in remote_etag:
+        return hashlib.md5(local_path.read_bytes()).hexdigest() == remote_etag
+    return True
+
+
+def _upload_s3_checked(s3, bucket: str, key: str, local_path: Path, retries: int = 3, verify: bool = False) -> None:
+    """Upload local file to s3://bucket/key with retries.
+
+    The post-upload HEAD size check is opt-in (`verify`): S3 already validates
+    the payload (ETag/Content-MD5) server-side, and the extra round-trip
+    doubles per-object latency on bulk syncs.
+    """
+    # parallelism lives at the object level (upload_prefix's pool), so keep
+    # the classic per-object transfer single-threaded; preferred_transfer_client
+    # routes through the AWS CRT transfer manager when boto3[crt] is installed,
+    # which schedules its own parallel multipart uploads
+    cfg = TransferConfig(
+        multipart_threshold=64 * 1024 * 1024,  # avoid multipart for small files
+        multipart_chunksize=16 * 1024 * 1024,
+        max_concurrency=1,
+        use_threads=False,
+        preferred_transfer_client="auto",
+    ) if TransferConfig is not None else None
+
+    size = local_path.stat().st_size
+    for attempt in range(1, retries + 1):
+        try:
+            if cfg is not None:
+                s3.upload_file(local_path.as_posix(), bucket, key, Config=cfg)
+            else:
+                s3.upload_file(local_path.as_posix(), bucket, key)
+
+            if verify:
+                head = s3.head_object(Bucket=bucket, Key=key)
+                if head.get("ContentLength", -1) != size:
+                    raise RuntimeError("s3-size-mismatch")
+
+            logger.info("✅ Uploaded: s3://%s/%s (%d bytes)", bucket, key, size)
+            return
+        except Exception as e:
+            # try to extract helpful info if botocore present
+            try:
+                import botocore
+                from botocore.exceptions import ClientError
+            except Exception:
+                ClientError = None
+
+            if ClientError is not None and isinstance(e, ClientError):
+                logger.warning("S3 ClientError (attempt=%d): %s", attempt, e)
+                code = e.response.get("Error", {}).get("Code", "")
+                if code in {"403", "AccessDenied"}:
+                    raise RuntimeError("s3-access-denied: check credentials and bucket policy") from e
+            else:
+                logger.warning("S3 upload failed (attempt=%d): %s", attempt, e)
+
+            time.sleep(attempt)
+
+    raise RuntimeError(f"upload_failed: s3://{bucket}/{key}")
+
+
+def upload_prefix(
+    bucket: str,
+    prefix: str,
+    local_root: Path,
+    s3=None,
+    dry_run: bool = False,
+    concurrency: int = 16,
+    verify: bool = False,
+    force: bool = False,
+) -> int:
+    """Upload all files under `local_root` to s3://bucket/prefix/... preserving relative paths.
+
+    Files go through a bounded thread pool — each PUT is latency-bound, so
+    object-level parallelism gives near-linear throughput gains. Unless
+    `force` is set, the target prefix is listed once up front and files whose
+    size (and MD5, for small files) already match the remote object are
+    skipped, making repeat syncs O(changed bytes).
+
+    Returns number of objects uploaded (or would be uploaded in dry-run).
+    """
+    if s3 is None:
+        if boto3 is None:
+            raise RuntimeError("boto3 is required to upload to S3 — install boto3")
+
+        # warn if credentials not detected
+        session = boto3.Session()
+        creds = session.get_credentials()
+        if creds is None and not any(os.environ.get(k) for k in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_PROFILE")):
+            logger.warning(
+                "AWS credentials not detected in environment. If you use a .env file, ensure it contains AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY or use a configured profile."
+            )
+
+        # one pooled client shared by all workers — clients are thread-safe
+        s3 = make_s3(concurrency)
+
+    prefix = prefix.strip("/")
+    count = 0
+
+    root = local_root
+    if not root.exists():
+        raise RuntimeError(f"local_root does not exist: {root}")
+
+    remote = {}
+    if not force and not dry_run:
+        try:
+            remote = _list_remote_objects(s3, bucket, prefix)
+        except Exception as e:
+            logger.warning("Could not list remote objects (uploading everything): %s", e)
+
+    skipped = 0
+    futures = {}
+    # submit while the local walk streams so uploads overlap directory scanning
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for local_path in _list_local_files_recursive(root):
+            rel = local_path.relative_to(root)
+            key = f"{prefix}/{rel.as_posix()}" if prefix else rel.as_posix()
+
+            if dry_run:
+                logger.info("[dry-run] %s -> s3://%s/%s", local_path, bucket, key)
+                count += 1
+                continue
+
+            if key in remote and _already_uploaded(local_path, local_path.stat().st_size, remote[key]):
+                logger.info("⏭️ Skipped (unchanged): s3://%s/%s", bucket, key)
+                skipped += 1
+                continue
+
+            futures[pool.submit(_upload_s3_checked, s3, bucket, key, local_path, verify=verify)] = key
+
+        # as_completed surfaces the first failure early instead of at join time
+        for fut in as_completed(futures):
+            fut.result()
+            count += 1
+
+    if skipped:
+        logger.info("Done. Objects processed: %d (skipped unchanged: %d)", count, skipped)
+    else:
+        logger.info("Done. Objects processed: %d", count)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--local-root",
+        default="data/refined",
+        help="Local root dir to upload (default: data/refined)",
+    )
+    parser.add_argument("--prefix", default="refined", help="S3 prefix to upload into (default: refined)")
+    parser.add_argument("--bucket", help="S3 bucket name (defaults to S3_BUCKET env var)")
+    parser.add_argument("--dry-run", action="store_true", help="List objects that would be uploaded and exit")
+    parser.add_argument("--concurrency", type=int, default=16, help="Parallel object uploads (default: 16)")
+    parser.add_argument("--verify", action="store_true", help="HEAD each object after upload to re-check its size")
+    parser.add_argument("--force", action="store_true", help="Upload everything, even files that match the remote copy")
+
+    args = parser.parse_args()
+
+    bucket = args.bucket or os.environ.get("S3_BUCKET")
+
+    if not bucket:
+        logger.error("S3 bucket not specified. Set --bucket or S3_BUCKET env var.")
+        sys.exit(2)
+
+    try:
+        upload_prefix(
+            bucket=bucket,
+            prefix=args.prefix,
+            local_root=Path(args.local_root),
+            dry_run=args.dry_run,
+            concurrency=args.concurrency,
+            verify=args.verify,
+            force=args.force,
+        )
+    except RuntimeError as e:
+        logger.error("Runtime error: %s", e)
+        sys.exit(4)
+    except Exception as e:
+        logger.exception("Unexpected error: %s", e)
+        sys.exit(99)
@@ -1,32 +1,91 @@
-import sys
-import pathlib
-from pathlib import Path
-
-# make the repository root importable for tests
-sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
-
-from read_refined import parse_partitions_from_path, filter_files
-
-
-def test_parse_partitions_from_path():
-    p = Path("data/refined/trade_date=2026-01-16/acao_negociada=VALE3.SA/b3.parquet")
-    parts = parse_partitions_from_path(p)
-    assert parts["trade_date"] == "2026-01-16"
-    assert parts["acao_negociada"] == "VALE3.SA"
-
-
-def test_filter_files_by_date_and_acao(tmp_path):
-    d = tmp_path / "refined"
-    (d / "trade_date=2026-01-16" / "acao_negociada=VALE3.SA").mkdir(parents=True)
-    f = (d / "trade_date=2026-01-16" / "acao_negociada=VALE3.SA" / "b3.parquet")
-    f.write_text("x")
-
-    # create another date
-    (d / "trade_date=2026-01-17" / "acao_negociada=PETR4.SA").mkdir(parents=True)
-    f2 = (d / "trade_date=2026-01-17" / "acao_negociada=PETR4.SA" / "b3.parquet")
-    f2.write_text("x")
-
-    files = list(d.rglob("*.parquet"))
-    res = filter_files(files, trade_dates=["2026-01-16"], acoes=["VALE3.SA"])
-    assert len(res) == 1
-    assert res[0].name == "b3.parquet"
+import sys
+import pathlib
+from pathlib import Path
+
+# make the repository root importable for tests
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from read_refined import parse_partitions_from_path, filter_files, stats_from_metadata, _stats_cache_path
+
+
+def test_parse_partitions_from_path():
+    p = Path("data/refined/trade_date=2026-01-16/acao_negociada=VALE3.SA/b3.parquet")
+    parts = parse_partitions_from_path(p)
+    assert parts["trade_date"] == "2026-01-16"
+    assert parts["acao_negociada"] == "VALE3.SA"
+
+
+def test_filter_files_by_date_and_acao(tmp_path):
+    d = tmp_path / "refined"
+    (d / "trade_date=2026-01-16" / "acao_negociada=VALE3.SA").mkdir(parents=True)
+    f = (d / "trade_date=2026-01-16" / "acao_negociada=VALE3.SA" / "b3.parquet")
+    f.write_text("x")
+
+    # create another date
+    (d / "trade_date=2026-01-17" / "acao_negociada=PETR4.SA").mkdir(parents=True)
+    f2 = (d / "trade_date=2026-01-17" / "acao_negociada=PETR4.SA" / "b3.parquet")
+    f2.write_text("x")
+
+    files = list(d.rglob("*.parquet"))
+    res = filter_files(files, trade_dates=["2026-01-16"], acoes=["VALE3.SA"])
+    assert len(res) == 1
+    assert res[0].name == "b3.parquet"
+
+
+def _write_leaf(base, date, acao, rows):
+    import pandas as pd
+
+    leaf = base / f"data_pregao={date}" / f"acao_negociada={acao}"
+    leaf.mkdir(parents=True, exist_ok=True)
+    f = leaf / "b3.parquet"
+    pd.DataFrame({"close": [1.0] * rows}).to_parquet(f)
+    return f
+
+
+def test_stats_cache_hit_and_invalidation_on_rewrite(tmp_path):
+    import json
+    import os
+
+    base = tmp_path / "refined"
+    f = _write_leaf(base, "2026-01-16", "VALE3.SA", 2)
+
+    stats = stats_from_metadata([f], cache_base=base)
+    assert stats["num_rows"].sum() == 2
+    cache = json.loads(_stats_cache_path(base).read_text())
+    assert cache[f.as_posix()][1] == 2
+
+    # unchanged file: the cached count is served (poison the cache to prove it)
+    cache[f.as_posix()][1] = 99
+    _stats_cache_path(base).write_text(json.dumps(cache))
+    stats = stats_from_metadata([f], cache_base=base)
+    assert stats["num_rows"].sum() == 99
+
+    # rewrite with a newer mtime: the entry is invalidated and re-read
+    f2 = _write_leaf(base, "2026-01-16", "VALE3.SA", 3)
+    os.utime(f2, (f2.stat().st_atime, f2.stat().st_mtime + 10))
+    stats = stats_from_metadata([f2], cache_base=base)
+    assert stats["num_rows"].sum() == 3
+
+
+def test_stats_cache_recovers_from_corrupt_file(tmp_path):
+    base = tmp_path / "refined"
+    f = _write_leaf(base, "2026-01-16", "VALE3.SA", 2)
+    _stats_cache_path(base).write_text("{not json")
+
+    stats = stats_from_metadata([f], cache_base=base)
+    assert stats["num_rows"].sum() == 2
+
+
+def test_stats_cache_prunes_deleted_files(tmp_path):
+    import json
+
+    base = tmp_path / "refined"
+    f1 = _write_leaf(base, "2026-01-16", "VALE3.SA", 2)
+    f2 = _write_leaf(base, "2026-01-17", "PETR4.SA", 1)
+    stats_from_metadata([f1, f2], cache_base=base)
+
+    f2.unlink()
+    stats_from_metadata([f1], cache_base=base)
+    cache = json.loads(_stats_cache_path(base).read_text())
+    assert f1.as_posix() in cache
+    assert f2.as_posix() not in cache
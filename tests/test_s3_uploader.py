@@ -0,0 +1,84 @@
+import hashlib
+import sys
+import pathlib
+from pathlib import Path
+
+# make the repository root importable for tests
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+from s3_uploader import MULTIPART_THRESHOLD, _already_uploaded, upload_prefix
+
+
+def test_already_uploaded_size_mismatch(tmp_path):
+    f = tmp_path / "a.parquet"
+    f.write_bytes(b"hello")
+    etag = hashlib.md5(b"hello").hexdigest()
+    assert not _already_uploaded(f, f.stat().st_size, (999, etag))
+
+
+def test_already_uploaded_md5_match_and_mismatch(tmp_path):
+    f = tmp_path / "a.parquet"
+    f.write_bytes(b"hello")
+    size = f.stat().st_size
+    good = hashlib.md5(b"hello").hexdigest()
+    stale = hashlib.md5(b"other").hexdigest()
+    assert _already_uploaded(f, size, (size, good))
+    # same size but different content must re-upload
+    assert not _already_uploaded(f, size, (size, stale))
+
+
+def test_already_uploaded_multipart_etag_relies_on_size(tmp_path):
+    f = tmp_path / "a.parquet"
+    f.write_bytes(b"hello")
+    size = f.stat().st_size
+    # multipart ETags ("<md5>-<parts>") are not an MD5 of the body, so a
+    # matching size is accepted without hashing
+    assert _already_uploaded(f, size, (size, "abc123-4"))
+    assert not _already_uploaded(f, size, (size + 1, "abc123-4"))
+
+
+class _StubPaginator:
+    def __init__(self, contents):
+        self._contents = contents
+
+    def paginate(self, Bucket, Prefix):
+        yield {"Contents": self._contents}
+
+
+class _StubS3:
+    """Minimal client: one LIST page plus a record of uploaded keys."""
+
+    def __init__(self, contents):
+        self._contents = contents
+        self.uploaded = []
+
+    def get_paginator(self, name):
+        return _StubPaginator(self._contents)
+
+    def upload_file(self, filename, bucket, key, Config=None, ExtraArgs=None):
+        self.uploaded.append(key)
+
+
+def test_upload_prefix_skips_unchanged_and_force_reuploads(tmp_path):
+    root = tmp_path / "refined"
+    root.mkdir()
+    same = root / "same.parquet"
+    same.write_bytes(b"hello")
+    changed = root / "changed.parquet"
+    changed.write_bytes(b"fresh content")
+
+    etag = hashlib.md5(b"hello").hexdigest()
+    contents = [
+        {"Key": "refined/same.parquet", "Size": same.stat().st_size, "ETag": f'"{etag}"'},
+        {"Key": "refined/changed.parquet", "Size": 999, "ETag": '"deadbeef"'},
+    ]
+
+    s3 = _StubS3(contents)
+    count = upload_prefix("bucket", "refined", root, s3=s3, concurrency=2)
+    assert count == 1
+    assert s3.uploaded == ["refined/changed.parquet"]
+
+    s3 = _StubS3(contents)
+    count = upload_prefix("bucket", "refined", root, s3=s3, concurrency=2, force=True)
+    assert count == 2
+    assert sorted(s3.uploaded) == ["refined/changed.parquet", "refined/same.parquet"]